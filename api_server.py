@@ -3,100 +3,201 @@ Production API Server for OMR Sheet Processor
 Designed for deployment on Render.com
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import os
 import cv2
-import numpy as np
-from werkzeug.utils import secure_filename
-from omr_processor import OMRProcessor
-import base64
+import orjson
+import torch
+from omr_processor import OMRProcessor, MicroBatcher, decode_image_bytes, decode_base64_image
 from io import BytesIO
-from PIL import Image
+
+
+class InMemoryRequest(Request):
+    """Keep multipart file parts in memory instead of spilling them to temp files"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Uploads are capped by MAX_CONTENT_LENGTH, so a BytesIO is always safe
+        return BytesIO()
+
+
+class OrjsonProvider(JSONProvider):
+    """Serialize responses with orjson, which also handles numpy scalars natively"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for cross-origin requests
 
 # Configuration
 MODEL_PATH = os.environ.get('MODEL_PATH', 'best.pt')
-UPLOAD_FOLDER = 'temp_uploads'
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+RAW_IMAGE_TYPES = {'image/jpeg', 'image/png'}
+ASYNC_BATCH = bool(os.environ.get('CELERY_BROKER_URL'))  # Queue batches on Celery when a broker is configured
+OPENCV_THREADS = int(os.environ.get('OPENCV_THREADS', 1))  # Gunicorn workers/threads already parallelize requests
+TORCH_THREADS = int(os.environ.get('TORCH_THREADS', 1))  # Same for torch's intra-op pool (YOLO/EasyOCR)
+SHARE_MODEL_MEMORY = os.environ.get('SHARE_MODEL_MEMORY', '0') == '1'  # Opt-in; copies weights into /dev/shm
+MICRO_BATCH_SIZE = int(os.environ.get('MICRO_BATCH_SIZE', 1))  # >1 batches YOLO across concurrent requests
+MICRO_BATCH_WAIT = float(os.environ.get('MICRO_BATCH_WAIT_MS', 20)) / 1000
 
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
-# Create upload folder
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Keep OpenCV and torch from spawning a thread per core in every worker
+cv2.setNumThreads(OPENCV_THREADS)
+cv2.setUseOptimized(True)
+torch.set_num_threads(TORCH_THREADS)
+
+if ASYNC_BATCH:
+    from celery import group
+    from celery.result import GroupResult
+    from tasks import celery_app, process_omr_task
 
-# Initialize OMR Processor (lazy loading)
+# Initialize OMR Processor at import time and warm it up, so the
+# first request doesn't pay for model loading. With gunicorn's preload,
+# forked workers already share the (never written) weight pages.
 processor = None
+MODEL_LOADED = False
+if os.path.exists(MODEL_PATH):
+    processor = OMRProcessor(MODEL_PATH)
+    processor.warmup()
+    if SHARE_MODEL_MEMORY:
+        processor.share_memory()
+    MODEL_LOADED = True
+
+# Optional dynamic batching of YOLO calls across request threads (pays off on GPU)
+batcher = None
+if processor is not None and MICRO_BATCH_SIZE > 1:
+    batcher = MicroBatcher(processor, max_batch=MICRO_BATCH_SIZE, max_wait=MICRO_BATCH_WAIT)
 
 def get_processor():
-    """Lazy load the processor to avoid loading on import"""
-    global processor
+    """Return the preloaded processor"""
     if processor is None:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
-        processor = OMRProcessor(MODEL_PATH)
+        raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
     return processor
 
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def process_image(proc, image):
+    """Process one decoded image, sharing the YOLO pass with concurrent requests if enabled"""
+    if batcher is not None and image is not None:
+        return proc.process_omr_array(image, debug=False, regions=batcher.detect_regions(image))
+    return proc.process_omr_array(image, debug=False)
+
+def process_raw_body(proc):
+    """Process the raw request body (encoded JPEG/PNG); format comes from the query string"""
+    output_format = request.args.get('format', 'simple')
+    
+    data = request.get_data(cache=False)
+    if not data:
+        return jsonify({'error': 'No image provided. Send the image bytes as the request body'}), 400
+    
+    # Decode body in memory
+    image = decode_image_bytes(data)
+    
+    # Process OMR
+    result = process_image(proc, image)
+    
+    return format_process_response(result, output_format)
 
-def decode_base64_image(base64_string):
-    """Decode base64 image string to OpenCV format"""
-    # Remove header if present
-    if ',' in base64_string:
-        base64_string = base64_string.split(',')[1]
+def format_process_response(result, output_format):
+    """Build the /api/process response for a processor result"""
+    # Check for processing errors
+    if "error" in result:
+        return jsonify({'error': result['error']}), 500
     
-    # Decode base64
-    img_data = base64.b64decode(base64_string)
+    # Format response based on requested format
+    if output_format == 'full':
+        response = result
+    else:  # simple format
+        response = {
+            'success': True,
+            'name': result.get('name', ''),
+            'roll_number': result.get('roll_number', ''),
+            'version': result.get('version', ''),
+            'answer_string': result.get('answer_string', ''),
+            'total_questions': len(result.get('answers', {}))
+        }
     
-    # Convert to PIL Image then to OpenCV
-    pil_image = Image.open(BytesIO(img_data))
-    opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    return jsonify(response), 200
+
+def summarize_batch_result(idx, result):
+    """Reduce a processor result to the simplified per-image batch entry"""
+    if "error" in result:
+        return {
+            'index': idx,
+            'success': False,
+            'error': result['error']
+        }
     
-    return opencv_image
+    return {
+        'index': idx,
+        'success': True,
+        'name': result.get('name', ''),
+        'roll_number': result.get('roll_number', ''),
+        'answer_string': result.get('answer_string', ''),
+        'total_questions': len(result.get('answers', {}))
+    }
+
+def allowed_file(filename):
+    """Check if file extension is allowed"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+# Static API documentation, serialized once at import
+HOME_JSON = orjson.dumps({
+    "service": "OMR Sheet Processor API",
+    "version": "1.0",
+    "status": "running",
+    "endpoints": {
+        "/api/process": {
+            "method": "POST",
+            "description": "Process OMR sheet image",
+            "content_types": ["multipart/form-data", "application/json", "image/jpeg", "image/png"],
+            "parameters": {
+                "file": "Image file (multipart/form-data)",
+                "image": "Base64 encoded image (JSON)",
+                "body": "Raw image bytes (image/jpeg or image/png, format via ?format=)",
+                "format": "Output format: 'full' or 'simple' (default: 'simple')"
+            }
+        },
+        "/api/process_raw": {
+            "method": "POST",
+            "description": "Process OMR sheet sent as raw image bytes (no base64/JSON overhead)",
+            "content_types": ["image/jpeg", "image/png"],
+            "parameters": {
+                "body": "Raw image bytes",
+                "format": "Query parameter: 'full' or 'simple' (default: 'simple')"
+            }
+        },
+        "/api/batch/<job_id>": {
+            "method": "GET",
+            "description": "Poll an asynchronous batch job (when CELERY_BROKER_URL is set)"
+        },
+        "/api/health": {
+            "method": "GET",
+            "description": "Health check endpoint"
+        }
+    },
+    "documentation": "https://github.com/bavi404/omr-sheet-processor"
+})
 
 @app.route('/')
 def home():
     """API documentation endpoint"""
-    return jsonify({
-        "service": "OMR Sheet Processor API",
-        "version": "1.0",
-        "status": "running",
-        "endpoints": {
-            "/api/process": {
-                "method": "POST",
-                "description": "Process OMR sheet image",
-                "content_types": ["multipart/form-data", "application/json"],
-                "parameters": {
-                    "file": "Image file (multipart/form-data)",
-                    "image": "Base64 encoded image (JSON)",
-                    "format": "Output format: 'full' or 'simple' (default: 'simple')"
-                }
-            },
-            "/api/health": {
-                "method": "GET",
-                "description": "Health check endpoint"
-            }
-        },
-        "documentation": "https://github.com/bavi404/omr-sheet-processor"
-    })
+    return Response(HOME_JSON, mimetype='application/json')
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    try:
-        proc = get_processor()
-        model_loaded = proc.model is not None
-    except:
-        model_loaded = False
-    
     return jsonify({
-        "status": "healthy" if model_loaded else "initializing",
-        "model_loaded": model_loaded,
+        "status": "healthy" if MODEL_LOADED else "initializing",
+        "model_loaded": MODEL_LOADED,
         "service": "OMR Processor API"
     })
 
@@ -108,16 +209,20 @@ def process_omr():
     Accepts either:
     1. Multipart form data with 'file' field
     2. JSON with base64 encoded 'image' field
+    3. Raw image body with Content-Type image/jpeg or image/png
     """
     try:
         # Get processor instance
         proc = get_processor()
         
-        # Get output format
-        output_format = request.form.get('format', 'simple') if request.form else request.json.get('format', 'simple')
+        # Handle raw image body (no multipart parsing at all)
+        if request.mimetype in RAW_IMAGE_TYPES:
+            return process_raw_body(proc)
         
         # Handle file upload
-        if 'file' in request.files:
+        elif 'file' in request.files:
+            output_format = request.form.get('format', 'simple')
+            
             file = request.files['file']
             
             if file.filename == '':
@@ -126,57 +231,47 @@ def process_omr():
             if not allowed_file(file.filename):
                 return jsonify({'error': 'Invalid file type. Use PNG, JPG, or JPEG'}), 400
             
-            # Save temporarily
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(filepath)
+            data = file.stream.read()
+            if not data:
+                return jsonify({'error': 'Uploaded file is empty'}), 400
             
-            # Process OMR
-            result = proc.process_omr(filepath, debug=False)
+            # Decode upload in memory
+            image = decode_image_bytes(data)
             
-            # Clean up
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            # Process OMR
+            result = process_image(proc, image)
         
         # Handle base64 image
         elif request.is_json and 'image' in request.json:
+            output_format = request.json.get('format', 'simple')
             base64_image = request.json['image']
             
             # Decode base64 to image
             image = decode_base64_image(base64_image)
             
-            # Save temporarily
-            temp_path = os.path.join(UPLOAD_FOLDER, 'temp_image.jpg')
-            cv2.imwrite(temp_path, image)
-            
             # Process OMR
-            result = proc.process_omr(temp_path, debug=False)
-            
-            # Clean up
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            result = process_image(proc, image)
         
         else:
             return jsonify({'error': 'No image provided. Send file or base64 encoded image'}), 400
         
-        # Check for processing errors
-        if "error" in result:
-            return jsonify({'error': result['error']}), 500
-        
-        # Format response based on requested format
-        if output_format == 'full':
-            response = result
-        else:  # simple format
-            response = {
-                'success': True,
-                'name': result.get('name', ''),
-                'roll_number': result.get('roll_number', ''),
-                'version': result.get('version', ''),
-                'answer_string': result.get('answer_string', ''),
-                'total_questions': len(result.get('answers', {}))
-            }
-        
-        return jsonify(response), 200
+        return format_process_response(result, output_format)
+    
+    except FileNotFoundError as e:
+        return jsonify({'error': f'Model file not found: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Processing failed: {str(e)}'}), 500
+
+@app.route('/api/process_raw', methods=['POST'])
+def process_omr_raw():
+    """
+    Process OMR sheet sent as the raw request body
+    
+    Body is the encoded image (JPEG/PNG); no JSON or base64 wrapping.
+    Output format is taken from the 'format' query parameter.
+    """
+    try:
+        return process_raw_body(get_processor())
     
     except FileNotFoundError as e:
         return jsonify({'error': f'Model file not found: {str(e)}'}), 500
@@ -201,39 +296,28 @@ def batch_process():
         if len(images) > 10:
             return jsonify({'error': 'Maximum 10 images per batch'}), 400
         
+        # Hand the work to Celery workers and return immediately
+        if ASYNC_BATCH:
+            job = group(process_omr_task.s(base64_image) for base64_image in images).apply_async()
+            job.save()
+            return jsonify({
+                'success': True,
+                'job_id': job.id,
+                'status_url': f'/api/batch/{job.id}'
+            }), 202
+        
         proc = get_processor()
-        results = []
         
-        for idx, base64_image in enumerate(images):
+        # Decode everything first so YOLO runs once over the whole batch
+        decoded = []
+        for base64_image in images:
             try:
-                # Decode and save temporarily
-                image = decode_base64_image(base64_image)
-                temp_path = os.path.join(UPLOAD_FOLDER, f'batch_{idx}.jpg')
-                cv2.imwrite(temp_path, image)
-                
-                # Process
-                result = proc.process_omr(temp_path, debug=False)
-                
-                # Clean up
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                
-                # Simplified result
-                results.append({
-                    'index': idx,
-                    'success': True,
-                    'name': result.get('name', ''),
-                    'roll_number': result.get('roll_number', ''),
-                    'answer_string': result.get('answer_string', ''),
-                    'total_questions': len(result.get('answers', {}))
-                })
-            
-            except Exception as e:
-                results.append({
-                    'index': idx,
-                    'success': False,
-                    'error': str(e)
-                })
+                decoded.append(decode_base64_image(base64_image))
+            except Exception:
+                decoded.append(None)
+        
+        results = [summarize_batch_result(idx, result)
+                   for idx, result in enumerate(proc.process_batch(decoded, cache_ocr=True))]
         
         return jsonify({
             'success': True,
@@ -244,6 +328,42 @@ def batch_process():
     except Exception as e:
         return jsonify({'error': f'Batch processing failed: {str(e)}'}), 500
 
+@app.route('/api/batch/<job_id>', methods=['GET'])
+def batch_status(job_id):
+    """
+    Poll an asynchronous batch job
+    Returns the job state, plus results once every image is done
+    """
+    if not ASYNC_BATCH:
+        return jsonify({'error': 'Asynchronous batch processing is not enabled'}), 404
+    
+    job = GroupResult.restore(job_id, app=celery_app)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    
+    if not job.ready():
+        return jsonify({
+            'job_id': job_id,
+            'state': 'PENDING',
+            'completed': job.completed_count(),
+            'total': len(job.results)
+        }), 200
+    
+    results = []
+    for idx, task in enumerate(job.results):
+        if task.successful():
+            results.append(summarize_batch_result(idx, task.result))
+        else:
+            results.append({'index': idx, 'success': False, 'error': str(task.result)})
+    
+    return jsonify({
+        'job_id': job_id,
+        'state': 'SUCCESS',
+        'success': True,
+        'processed': len(results),
+        'results': results
+    }), 200
+
 # Error handlers
 @app.errorhandler(413)
 def too_large(e):
@@ -254,6 +374,8 @@ def server_error(e):
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
+    # Local development only; in production run:
+    #   gunicorn -c gunicorn.conf.py api_server:app
     port = int(os.environ.get('PORT', 10000))
     
     print("\n" + "="*60)
@@ -1,21 +1,18 @@
 from flask import Flask, request, jsonify, render_template_string
-import os
-from werkzeug.utils import secure_filename
-from omr_processor import OMRProcessor
+from omr_processor import OMRProcessor, decode_image_bytes
 import json
 
 app = Flask(__name__)
 
 # Configuration
 MODEL_PATH = r"C:\Users\sanka\runs\detect\train3\weights\best.pt"
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
-# Create upload folder
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# Initialize OMR Processor
+# Initialize OMR Processor and warm it up before the first request.
+# Under gunicorn (without preload) this runs once in each worker after the fork:
+#   GUNICORN_PRELOAD=0 gunicorn -w 4 -k gthread --threads 2 -b 0.0.0.0:5000 app:app
 processor = OMRProcessor(MODEL_PATH)
+processor.warmup()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -302,17 +299,11 @@ def process_omr():
         return jsonify({'error': 'Invalid file type. Use PNG, JPG, or JPEG'}), 400
     
     try:
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        # Decode upload in memory (no disk round-trip)
+        image = decode_image_bytes(file.read())
         
         # Process OMR
-        result = processor.process_omr(filepath, debug=False)
-        
-        # Clean up
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        result = processor.process_omr_array(image, debug=False)
         
         if "error" in result:
             return jsonify({'error': result['error']}), 500
@@ -1,5 +1,8 @@
 import os
 import json
+import cv2
+import torch
+from concurrent.futures import ProcessPoolExecutor
 from omr_processor import OMRProcessor
 from glob import glob
 
@@ -7,81 +10,134 @@ from glob import glob
 MODEL_PATH = r"C:\Users\sanka\runs\detect\train3\weights\best.pt"
 TEST_IMAGES_DIR = r"C:\Users\sanka\Downloads\OMR MCQS DATASET.v1i.yolov8\test\images"
 OUTPUT_DIR = "batch_results"
+BATCH_SIZE = 16  # Images per YOLO call (bounded by memory for the largest images)
+NUM_WORKERS = os.cpu_count() or 1  # Worker processes, each loads its own model
 
-# Create output directory
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Per-worker processor, set up by init_worker
+processor = None
 
-# Initialize processor
-print("="*60)
-print("BATCH OMR PROCESSING")
-print("="*60)
-processor = OMRProcessor(MODEL_PATH)
+def init_worker(model_path):
+    """Load the model once in each worker process"""
+    global processor
+    # Parallelism comes from the process pool, so keep each worker single-threaded
+    cv2.setNumThreads(1)
+    torch.set_num_threads(1)
+    processor = OMRProcessor(model_path)
 
-# Find all test images
-image_files = glob(os.path.join(TEST_IMAGES_DIR, "*.jpg")) + \
-              glob(os.path.join(TEST_IMAGES_DIR, "*.png"))
-
-print(f"\nFound {len(image_files)} images to process\n")
-
-# Process each image
-results_summary = []
-
-for i, image_path in enumerate(image_files, 1):
-    filename = os.path.basename(image_path)
-    print(f"[{i}/{len(image_files)}] Processing: {filename}...")
-    
+def process_chunk(paths):
+    """Process a chunk of images with one YOLO call; returns (path, result, error) tuples"""
+    images = [cv2.imread(path) for path in paths]
     try:
-        result = processor.process_omr(image_path, debug=False)
-        
-        # Save individual result
-        output_file = os.path.join(OUTPUT_DIR, f"{os.path.splitext(filename)[0]}.json")
-        with open(output_file, 'w') as f:
-            json.dump(result, f, indent=4)
-        
-        # Add to summary
-        summary = {
-            "filename": filename,
-            "name": result.get("name", ""),
-            "roll_number": result.get("roll_number", ""),
-            "questions_detected": len(result.get("answers", {})),
-            "answer_string": result.get("answer_string", ""),
-            "status": "✓ Success"
-        }
-        results_summary.append(summary)
-        
-        print(f"  ✓ Detected {len(result['answers'])} questions")
-        print(f"  ✓ Name: {result['name']}")
-        print(f"  ✓ Answers: {result['answer_string'][:30]}...")
-        
+        batch_regions = iter(processor.detect_regions_batch([img for img in images if img is not None]))
     except Exception as e:
-        print(f"  ✗ ERROR: {str(e)}")
-        results_summary.append({
-            "filename": filename,
-            "status": f"✗ Error: {str(e)}"
-        })
+        return [(path, None, str(e)) for path in paths]
     
-    print()
-
-# Save summary
-summary_file = os.path.join(OUTPUT_DIR, "_summary.json")
-with open(summary_file, 'w') as f:
-    json.dump(results_summary, f, indent=4)
-
-# Print summary
-print("="*60)
-print("PROCESSING COMPLETE")
-print("="*60)
-print(f"\nProcessed: {len(image_files)} images")
-print(f"Success: {sum(1 for r in results_summary if '✓' in r['status'])}")
-print(f"Errors: {sum(1 for r in results_summary if '✗' in r['status'])}")
-print(f"\nResults saved to: {OUTPUT_DIR}/")
-print(f"Summary saved to: {summary_file}")
+    ocr_cache = {}  # Identical text crops within the chunk share one OCR pass
+    
+    outcomes = []
+    for path, image in zip(paths, images):
+        regions = next(batch_regions) if image is not None else None
+        try:
+            result = processor.process_omr_array(image, debug=False, regions=regions, ocr_cache=ocr_cache)
+            outcomes.append((path, result, None))
+        except Exception as e:
+            outcomes.append((path, None, str(e)))
+    
+    return outcomes
 
-# Statistics
-if results_summary:
-    questions_detected = [r.get("questions_detected", 0) for r in results_summary if "questions_detected" in r]
-    if questions_detected:
-        avg_questions = sum(questions_detected) / len(questions_detected)
-        print(f"\nAverage questions detected: {avg_questions:.1f}")
-        print(f"Min: {min(questions_detected)}, Max: {max(questions_detected)}")
+def main():
+    # Create output directory
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    
+    print("="*60)
+    print("BATCH OMR PROCESSING")
+    print("="*60)
+    
+    # Find all test images
+    image_files = glob(os.path.join(TEST_IMAGES_DIR, "*.jpg")) + \
+                  glob(os.path.join(TEST_IMAGES_DIR, "*.png"))
+    
+    print(f"\nFound {len(image_files)} images to process\n")
+    
+    # Split into chunks, small enough that every worker gets work
+    chunk_size = max(1, min(BATCH_SIZE, -(-len(image_files) // NUM_WORKERS)))
+    chunks = [image_files[i:i + chunk_size] for i in range(0, len(image_files), chunk_size)]
+    
+    # Process each image
+    results_summary = []
+    i = 0
+    
+    # No more workers than chunks: each one loads its own model copy
+    with ProcessPoolExecutor(max_workers=max(1, min(NUM_WORKERS, len(chunks))), initializer=init_worker,
+                             initargs=(MODEL_PATH,)) as executor:
+        futures = [executor.submit(process_chunk, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            # A crashed worker (BrokenProcessPool) fails its chunk, not the whole run
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                outcomes = [(path, None, str(e)) for path in chunk]
+            
+            for image_path, result, error in outcomes:
+                i += 1
+                filename = os.path.basename(image_path)
+                print(f"[{i}/{len(image_files)}] Processing: {filename}...")
+                
+                try:
+                    if error is not None or "error" in result:
+                        raise RuntimeError(error if error is not None else result["error"])
+                    
+                    # Save individual result
+                    output_file = os.path.join(OUTPUT_DIR, f"{os.path.splitext(filename)[0]}.json")
+                    with open(output_file, 'w') as f:
+                        json.dump(result, f, indent=4)
+                    
+                    # Add to summary
+                    summary = {
+                        "filename": filename,
+                        "name": result.get("name", ""),
+                        "roll_number": result.get("roll_number", ""),
+                        "questions_detected": len(result.get("answers", {})),
+                        "answer_string": result.get("answer_string", ""),
+                        "status": "✓ Success"
+                    }
+                    results_summary.append(summary)
+                    
+                    print(f"  ✓ Detected {len(result['answers'])} questions")
+                    print(f"  ✓ Name: {result['name']}")
+                    print(f"  ✓ Answers: {result['answer_string'][:30]}...")
+                    
+                except Exception as e:
+                    print(f"  ✗ ERROR: {str(e)}")
+                    results_summary.append({
+                        "filename": filename,
+                        "status": f"✗ Error: {str(e)}"
+                    })
+                
+                print()
+    
+    # Save summary
+    summary_file = os.path.join(OUTPUT_DIR, "_summary.json")
+    with open(summary_file, 'w') as f:
+        json.dump(results_summary, f, indent=4)
+    
+    # Print summary
+    print("="*60)
+    print("PROCESSING COMPLETE")
+    print("="*60)
+    print(f"\nProcessed: {len(image_files)} images")
+    print(f"Success: {sum(1 for r in results_summary if '✓' in r['status'])}")
+    print(f"Errors: {sum(1 for r in results_summary if '✗' in r['status'])}")
+    print(f"\nResults saved to: {OUTPUT_DIR}/")
+    print(f"Summary saved to: {summary_file}")
+    
+    # Statistics
+    if results_summary:
+        questions_detected = [r.get("questions_detected", 0) for r in results_summary if "questions_detected" in r]
+        if questions_detected:
+            avg_questions = sum(questions_detected) / len(questions_detected)
+            print(f"\nAverage questions detected: {avg_questions:.1f}")
+            print(f"Min: {min(questions_detected)}, Max: {max(questions_detected)}")
 
+if __name__ == "__main__":
+    main()
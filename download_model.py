@@ -4,30 +4,29 @@ Run during Render deployment build phase
 """
 
 import os
+import shutil
 import requests
 from pathlib import Path
 
 def download_file(url, destination):
-    """Download file from URL with progress"""
+    """Download file from URL"""
     print(f"Downloading model from: {url}")
     
     response = requests.get(url, stream=True)
     response.raise_for_status()
     
     total_size = int(response.headers.get('content-length', 0))
-    block_size = 8192
-    downloaded = 0
+    block_size = 1024 * 1024  # 1 MiB
     
+    if total_size > 0:
+        print(f"Expected size: {total_size / (1024*1024):.2f} MB")
+    
+    # Stream straight to disk in large blocks (gzip/deflate still decoded)
+    response.raw.decode_content = True
     with open(destination, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=block_size):
-            if chunk:
-                f.write(chunk)
-                downloaded += len(chunk)
-                if total_size > 0:
-                    percent = (downloaded / total_size) * 100
-                    print(f"\rProgress: {percent:.1f}%", end='', flush=True)
+        shutil.copyfileobj(response.raw, f, length=block_size)
     
-    print(f"\n✅ Model downloaded to: {destination}")
+    print(f"✅ Model downloaded to: {destination}")
     print(f"   Size: {os.path.getsize(destination) / (1024*1024):.2f} MB")
 
 def main():
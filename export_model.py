@@ -0,0 +1,39 @@
+"""
+Export the trained YOLOv8 model to ONNX for inference with ONNX Runtime
+
+Usage:
+    pip install onnx onnxruntime
+    python export_model.py          # best.pt -> best.onnx
+
+Then set MODEL_PATH to the exported .onnx file; OMRProcessor loads it
+through Ultralytics' ONNX Runtime backend. Benchmark it against the .pt
+model on your hardware before switching.
+"""
+
+import os
+import sys
+from ultralytics import YOLO
+
+def export_onnx(model_path):
+    """Export model to ONNX"""
+    print(f"Exporting {model_path} to ONNX...")
+    
+    # dynamic=True keeps the batch dimension open for batched inference
+    onnx_path = YOLO(model_path).export(format='onnx', dynamic=True, simplify=True)
+    
+    print(f"✅ ONNX model saved to: {onnx_path}")
+    return onnx_path
+
+def main():
+    """Main export function"""
+    model_path = os.environ.get('MODEL_PATH', 'best.pt')
+    
+    if not os.path.exists(model_path):
+        print(f"❌ Model not found at: {model_path}")
+        return 1
+    
+    export_onnx(model_path)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Gunicorn configuration for the OMR API server
+Usage: gunicorn -c gunicorn.conf.py api_server:app
+"""
+
+import os
+
+# Server socket
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+
+# Workers: threaded workers so a long inference doesn't block the others.
+# Each worker holds its own YOLO/EasyOCR activations, so default to one
+# (fits the 512MB free tier); raise WEB_CONCURRENCY on larger instances.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Load the app (and the YOLO model) once in the master; forked workers
+# share the weights. Set GUNICORN_PRELOAD=0 to load per worker after the
+# fork instead (e.g. for app.py). This is required on CUDA hosts: the
+# warmup at import initializes CUDA, which forked workers can't reuse.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# OMR processing can take a while on CPU
+timeout = 120
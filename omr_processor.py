@@ -1,42 +1,160 @@
+import pybase64 as base64
+import hashlib
+import mmap
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 import cv2
 import numpy as np
+import torch
 import easyocr
 from ultralytics import YOLO
 
+# Run blur/threshold through OpenCV's OpenCL backend (T-API) when a device is available.
+# Set USE_OPENCL=0 to force the CPU path.
+USE_OPENCL = os.environ.get('USE_OPENCL', '1') == '1'
+_opencl_state = (None, False)  # (pid, available) of the last device probe
+
+def decode_image_bytes(data):
+    """Decode encoded image bytes (JPEG/PNG) to a BGR image (None if empty or undecodable)."""
+    if not data:
+        return None  # cv2.imdecode asserts on an empty buffer
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def to_gray(image):
+    """Return a grayscale view of a BGR image (grayscale input is passed through)."""
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def decode_base64_image(base64_string):
+    """Decode a base64 image string (optionally a data URL) to a BGR image."""
+    # Remove data URL header if present (e.g. "data:image/jpeg;base64,")
+    if base64_string.startswith('data:'):
+        base64_string = base64_string.split(',', 1)[1]
+    
+    # Decode base64 straight into an OpenCV (BGR) image
+    return decode_image_bytes(base64.b64decode(base64_string))
+
+def candidate_contours(mask, min_area):
+    """External contours of only those blobs in a binary mask that could pass the bubble filters."""
+    # Fill holes so each blob's pixel count bounds its contour area from above
+    outside = cv2.copyMakeBorder(mask, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(outside, None, (0, 0), 255)
+    solid = cv2.bitwise_or(mask, cv2.bitwise_not(outside[1:-1, 1:-1]))
+    
+    # Drop specks and elongated noise from the component stats (label 0 is background)
+    # before any contour is traced
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(solid, connectivity=8)
+    aspect_ratios = stats[:, cv2.CC_STAT_WIDTH] / np.maximum(stats[:, cv2.CC_STAT_HEIGHT], 1)
+    candidates = ((stats[:, cv2.CC_STAT_AREA] > min_area) &
+                  (aspect_ratios >= 0.4) & (aspect_ratios <= 2.5))  # Very flexible for various shapes
+    candidates[0] = False
+    
+    contours, _ = cv2.findContours(candidates.astype(np.uint8)[labels], cv2.RETR_EXTERNAL,
+                                   cv2.CHAIN_APPROX_SIMPLE)
+    return list(contours)
+
+def opencl_available():
+    """Whether to use OpenCL, probed on first use in each process (drivers aren't fork-safe)."""
+    global _opencl_state
+    pid, available = _opencl_state
+    if pid != os.getpid():
+        available = USE_OPENCL and cv2.ocl.haveOpenCL()
+        _opencl_state = (os.getpid(), available)
+    return available
+
+def prefetch_file(path):
+    """Pull a file into the page cache with MAP_POPULATE (Linux) so a later load reads from memory."""
+    if not hasattr(mmap, "MAP_POPULATE"):
+        return
+    
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    
+    try:
+        mmap.mmap(fd, 0, flags=mmap.MAP_PRIVATE | mmap.MAP_POPULATE, prot=mmap.PROT_READ).close()
+    except (OSError, ValueError):
+        pass  # e.g. empty file; the real load will report problems
+    finally:
+        os.close(fd)
+
 class OMRProcessor:
     def __init__(self, model_path):
-        """Initialize OMR processor with YOLO model."""
-        self.model = YOLO(model_path)
-        self.reader = easyocr.Reader(['en'], gpu=False)
+        """Initialize OMR processor with YOLO model (.pt, or .onnx from export_model.py)."""
+        # Read the weights into the page cache while EasyOCR initializes
+        prefetch = threading.Thread(target=prefetch_file, args=(model_path,), daemon=True)
+        prefetch.start()
+        self.reader = easyocr.Reader(['en'], gpu=False, quantize=True)  # INT8 dynamic quantization on CPU
+        prefetch.join()
+        
+        self.model = YOLO(model_path, task="detect")
+        # FP16 inference on GPU for PyTorch weights (exported models keep their own precision)
+        self.half = torch.cuda.is_available() and str(model_path).endswith(".pt")
+        # Class id -> label, restricted to the regions we use
+        self._valid_cls = {cid: name for cid, name in self.model.names.items()
+                           if name in {"name", "r_number", "v_number", "mcqs", "m_area"}}
+        # OCR runs here while bubble detection continues on the calling thread
+        self._io_pool = ThreadPoolExecutor(max_workers=3)
+    
+    def warmup(self, size=640):
+        """Run dummy YOLO and OCR passes so one-time backend setup happens before real requests."""
+        self.model(np.zeros((size, size, 3), dtype=np.uint8), conf=0.25, half=self.half, verbose=False)
+        self.reader.readtext(np.zeros((64, 128), dtype=np.uint8), detail=0)
+    
+    def share_memory(self):
+        """Move model weights into shared memory (/dev/shm), e.g. for torch.multiprocessing workers."""
+        if hasattr(self.model.model, "share_memory"):
+            self.model.model.share_memory()
         
     def detect_regions(self, image, conf=0.25):
         """Detect OMR regions using YOLO."""
-        results = self.model(image, conf=conf)[0]
+        results = self.model(image, conf=conf, half=self.half)[0]
+        return self._parse_regions(results)
+    
+    def detect_regions_batch(self, images, conf=0.25):
+        """Detect OMR regions for several images in a single YOLO call."""
+        if not images:
+            return []
+        return [self._parse_regions(results) for results in self.model(images, conf=conf, half=self.half)]
+    
+    def _parse_regions(self, results):
+        """Convert one YOLO result into a {label: {box, confidence}} dict."""
         regions = {}
+        boxes = results.boxes
         
-        for box in results.boxes:
-            cls = int(box.cls)
-            label = self.model.names[cls]
-            confidence = float(box.conf)
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            
-            if label in ["name", "r_number", "v_number", "mcqs", "m_area"]:
-                regions[label] = {
-                    "box": (x1, y1, x2, y2),
-                    "confidence": confidence
-                }
+        # Drop boxes of classes we don't use before any per-box Python work
+        cls_arr = boxes.cls.cpu().numpy().astype(int)
+        mask = np.isin(cls_arr, list(self._valid_cls))
+        xyxy = boxes.xyxy.cpu().numpy().astype(int)[mask]
+        conf = boxes.conf.cpu().numpy()[mask]
+        
+        for cls, (x1, y1, x2, y2), confidence in zip(cls_arr[mask].tolist(), xyxy.tolist(), conf.tolist()):
+            regions[self._valid_cls[cls]] = {
+                "box": (x1, y1, x2, y2),
+                "confidence": confidence
+            }
         
         return regions
     
-    def extract_text(self, image, region_box):
-        """Extract text from a region using OCR."""
+    def extract_text(self, image, region_box, ocr_cache=None):
+        """Extract text from a region using OCR; identical crops reuse results from ocr_cache if given."""
         x1, y1, x2, y2 = region_box
         crop = image[y1:y2, x1:x2]
         
         # Preprocess for better OCR
-        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        gray = to_gray(crop)
         gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
         
+        if ocr_cache is not None:
+            key = (gray.shape, hashlib.blake2b(np.ascontiguousarray(gray), digest_size=8).digest())
+            if key not in ocr_cache:
+                ocr_cache[key] = " ".join(self.reader.readtext(gray, detail=0)).strip()
+            return ocr_cache[key]
+        
         text = self.reader.readtext(gray, detail=0)
         return " ".join(text).strip()
     
@@ -45,67 +163,66 @@ class OMRProcessor:
         x1, y1, x2, y2 = region_box
         roi = image[y1:y2, x1:x2]
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        # Convert to grayscale (uploaded to the OpenCL device if enabled)
+        gray = to_gray(roi)
+        use_ocl = opencl_available()
+        src = cv2.UMat(np.ascontiguousarray(gray)) if use_ocl else gray
         
         # Try multiple preprocessing methods
-        all_bubbles = []
-        
         # Method 1: Otsu's thresholding
-        blur1 = cv2.GaussianBlur(gray, (5, 5), 0)
+        blur1 = cv2.GaussianBlur(src, (5, 5), 0)
         _, thresh1 = cv2.threshold(blur1, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        contours1, _ = cv2.findContours(thresh1, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         # Method 2: Adaptive thresholding
-        thresh2 = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        thresh2 = cv2.adaptiveThreshold(src, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                        cv2.THRESH_BINARY_INV, 11, 2)
-        contours2, _ = cv2.findContours(thresh2, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        # Combine contours from both methods
-        all_contours = list(contours1) + list(contours2)
+        if use_ocl:
+            # Download for the CPU-only steps below
+            thresh1, thresh2 = thresh1.get(), thresh2.get()
+        
+        # Trace each mask separately (a union would merge blobs the two passes keep apart)
+        all_contours = candidate_contours(thresh1, min_area) + candidate_contours(thresh2, min_area)
+        
+        if not all_contours:
+            return []
+        
+        # Exact filter on the few remaining contours by area
+        rects = np.array([cv2.boundingRect(cnt) for cnt in all_contours], dtype=np.int32)
+        areas = np.array([cv2.contourArea(cnt) for cnt in all_contours])
+        keep = (areas > min_area) & (areas < max_area)
+        rects, areas = rects[keep], areas[keep]
+        
+        # Calculate centers
+        cxs = x1 + rects[:, 0] + rects[:, 2] // 2
+        cys = y1 + rects[:, 1] + rects[:, 3] // 2
+        
+        # Drop duplicates (bubbles detected by both methods) with grid-based
+        # deduplication, keeping the first contour that landed in each cell
+        _, first = np.unique(np.stack([cxs // 5, cys // 5], axis=1), axis=0, return_index=True)
+        first.sort()
+        
+        rects, areas, cxs, cys = rects[first], areas[first], cxs[first], cys[first]
+        
+        # Calculate fill ratios using Otsu threshold: filled pixel counts for
+        # every box come from four lookups into one integral image
+        integral = cv2.integral(thresh1 // 255)
+        bx1, by1 = rects[:, 0], rects[:, 1]
+        bx2, by2 = bx1 + rects[:, 2], by1 + rects[:, 3]
+        filled_pixels = (integral[by2, bx2] - integral[by1, bx2]
+                         - integral[by2, bx1] + integral[by1, bx1])
+        fill_ratios = filled_pixels / np.maximum(rects[:, 2] * rects[:, 3], 1)
         
-        # Store unique bubbles (avoid duplicates)
-        seen_positions = set()
         bubbles = []
         
-        for cnt in all_contours:
-            area = cv2.contourArea(cnt)
-            
-            # Filter by area
-            if min_area < area < max_area:
-                # Get bounding box
-                bx, by, bw, bh = cv2.boundingRect(cnt)
-                
-                # Check if roughly circular
-                aspect_ratio = float(bw) / bh if bh > 0 else 0
-                if 0.4 <= aspect_ratio <= 2.5:  # Very flexible for various shapes
-                    # Calculate center
-                    cx_rel = bx + bw // 2
-                    cy_rel = by + bh // 2
-                    cx = x1 + cx_rel
-                    cy = y1 + cy_rel
-                    
-                    # Check for duplicates (bubbles detected by both methods)
-                    pos_key = (cx // 5, cy // 5)  # Grid-based deduplication
-                    if pos_key in seen_positions:
-                        continue
-                    seen_positions.add(pos_key)
-                    
-                    # Calculate fill ratio using Otsu threshold
-                    roi_bubble = thresh1[by:by+bh, bx:bx+bw]
-                    if roi_bubble.size > 0:
-                        filled_pixels = cv2.countNonZero(roi_bubble)
-                        total_pixels = bw * bh
-                        fill_ratio = filled_pixels / total_pixels if total_pixels > 0 else 0
-                    else:
-                        fill_ratio = 0
-                    
-                    bubbles.append({
-                        "center": (cx, cy),
-                        "box": (x1 + bx, y1 + by, x1 + bx + bw, y1 + by + bh),
-                        "area": area,
-                        "fill_ratio": fill_ratio
-                    })
+        for (bx, by, bw, bh), cx, cy, area, fill_ratio in zip(rects.tolist(), cxs.tolist(), cys.tolist(),
+                                                              areas.tolist(), fill_ratios.tolist()):
+            bubbles.append({
+                "center": (cx, cy),
+                "box": (x1 + bx, y1 + by, x1 + bx + bw, y1 + by + bh),
+                "area": area,
+                "fill_ratio": fill_ratio
+            })
         
         return bubbles
     
@@ -114,68 +231,42 @@ class OMRProcessor:
         if not bubbles:
             return []
         
-        # Step 1: Group by Y-coordinate into rows
-        sorted_by_y = sorted(bubbles, key=lambda b: b["center"][1])
-        
-        rows = []
-        current_row = [sorted_by_y[0]]
-        
-        for i in range(1, len(sorted_by_y)):
-            prev_y = sorted_by_y[i-1]["center"][1]
-            curr_y = sorted_by_y[i]["center"][1]
-            
-            if abs(curr_y - prev_y) <= vertical_threshold:
-                current_row.append(sorted_by_y[i])
-            else:
-                rows.append(current_row)
-                current_row = [sorted_by_y[i]]
+        centers = np.array([b["center"] for b in bubbles])
         
-        rows.append(current_row)
+        # Step 1: Group by Y-coordinate into rows (split where the Y-gap is large)
+        order_y = np.argsort(centers[:, 1], kind="stable")
+        row_breaks = np.flatnonzero(np.diff(centers[order_y, 1]) > vertical_threshold) + 1
+        rows = np.split(order_y, row_breaks)
         
         # Step 2: Within each row, group by X-coordinate (handle multiple columns)
         all_questions = []
         
         for row in rows:
             # Sort bubbles in row by X-coordinate
-            row_sorted = sorted(row, key=lambda b: b["center"][0])
-            
-            # Group by X-position to separate columns
-            column_groups = []
-            current_group = [row_sorted[0]]
-            
-            for i in range(1, len(row_sorted)):
-                prev_x = row_sorted[i-1]["center"][0]
-                curr_x = row_sorted[i]["center"][0]
-                
-                # If X-gap is large, it's a new column/question
-                if abs(curr_x - prev_x) > horizontal_threshold:
-                    column_groups.append(current_group)
-                    current_group = [row_sorted[i]]
-                else:
-                    current_group.append(row_sorted[i])
+            row_sorted = row[np.argsort(centers[row, 0], kind="stable")]
             
-            column_groups.append(current_group)
+            # If X-gap is large, it's a new column/question
+            column_breaks = np.flatnonzero(np.diff(centers[row_sorted, 0]) > horizontal_threshold) + 1
             
-            # Each column group in a row is a separate question
-            for group in column_groups:
-                # Sort left to right within question
-                group_sorted = sorted(group, key=lambda b: b["center"][0])
+            # Each column group in a row is a separate question, already sorted left to right
+            for group in np.split(row_sorted, column_breaks):
                 # Only keep groups with 1-8 bubbles (valid question) - be flexible
-                if 1 <= len(group_sorted) <= 8:
-                    all_questions.append(group_sorted)
+                if 1 <= len(group) <= 8:
+                    all_questions.append([bubbles[i] for i in group])
         
         return all_questions
     
-    def extract_mcq_answers(self, image, mcq_region_box, fill_threshold=0.25, debug=False):
-        """Extract MCQ answers from the MCQ region."""
+    def extract_mcq_answers(self, image, mcq_region_box, fill_threshold=0.25, debug=False, bubbles=None):
+        """Extract MCQ answers from the MCQ region (reusing already detected bubbles if given)."""
         # Detect bubbles in MCQ region
-        bubbles = self.detect_bubbles_in_region(image, mcq_region_box)
+        if bubbles is None:
+            bubbles = self.detect_bubbles_in_region(image, mcq_region_box)
         
         if debug:
             print(f"Total bubbles detected: {len(bubbles)}")
         
         if not bubbles:
-            return {}
+            return []
         
         # Group into questions
         questions = self.group_bubbles_into_questions(bubbles)
@@ -184,23 +275,22 @@ class OMRProcessor:
             print(f"Grouped into {len(questions)} questions")
         
         # Extract answers
-        answers = {}
         options = ['A', 'B', 'C', 'D', 'E']  # Support up to 5 options
         
-        for q_num, question_bubbles in enumerate(questions, start=1):
+        # Fill ratios as a (questions x options) matrix, padded with -1 (never filled)
+        fill = np.full((len(questions), len(options)), -1.0)
+        for q, question_bubbles in enumerate(questions):
             # Sort left to right
             question_bubbles.sort(key=lambda b: b["center"][0])
-            
-            # Find filled bubble
-            selected = None
-            for idx, bubble in enumerate(question_bubbles):
-                if bubble["fill_ratio"] > fill_threshold and idx < len(options):
-                    selected = options[idx]
-                    break
-            
-            answers[f"Q{q_num}"] = selected
+            ratios = [bubble["fill_ratio"] for bubble in question_bubbles[:len(options)]]
+            fill[q, :len(ratios)] = ratios
         
-        return answers
+        # Find filled bubble: first option above threshold, -1 if none
+        marked = fill > fill_threshold
+        selected = np.where(marked.any(axis=1), marked.argmax(axis=1), -1)
+        
+        # Answers in question order (index 0 is Q1), None where nothing is marked
+        return [options[idx] if idx >= 0 else None for idx in selected.tolist()]
     
     def extract_roll_number_bubbles(self, image, roll_region_box, fill_threshold=0.3):
         """Extract roll number from bubble grid (numbers 0-9 in columns)."""
@@ -229,15 +319,17 @@ class OMRProcessor:
         
         columns.append(current_col)
         
-        # Extract digit from each column
-        roll_number = ""
-        for col in columns:
+        # Fill ratios as a (columns x rows) matrix, padded with -1 (never filled)
+        fill = np.full((len(columns), max(len(col) for col in columns)), -1.0)
+        for c, col in enumerate(columns):
             col.sort(key=lambda b: b["center"][1])  # Top to bottom
-            
-            for idx, bubble in enumerate(col):
-                if bubble["fill_ratio"] > fill_threshold:
-                    roll_number += str(idx)
-                    break
+            fill[c, :len(col)] = [bubble["fill_ratio"] for bubble in col]
+        
+        # Extract digit from each column: first row above threshold
+        marked = fill > fill_threshold
+        digits = marked.argmax(axis=1).tolist()
+        roll_number = "".join(str(digit) for digit, has_mark in zip(digits, marked.any(axis=1).tolist())
+                              if has_mark)
         
         return roll_number
     
@@ -245,16 +337,42 @@ class OMRProcessor:
         """Process complete OMR sheet and extract all information."""
         # Load image
         image = cv2.imread(image_path)
-        
+        result = self.process_omr_array(image, debug=debug)
+        if debug and "error" not in result:
+            result["_image"] = image  # Lets callers annotate without reading the file again
+        return result
+    
+    def process_batch(self, images, debug=False, cache_ocr=False):
+        """Process several decoded images, running YOLO once for the whole batch."""
+        valid = [i for i, image in enumerate(images) if image is not None]
+        batch_regions = self.detect_regions_batch([images[i] for i in valid])
+        ocr_cache = {} if cache_ocr else None  # Shared by identical text crops, e.g. one exam's version field
+        
+        results = [{"error": "Could not load image"} for _ in images]
+        for i, regions in zip(valid, batch_regions):
+            # One bad sheet must not lose the results of the others
+            try:
+                results[i] = self.process_omr_array(images[i], debug=debug, regions=regions, ocr_cache=ocr_cache)
+            except Exception as e:
+                results[i] = {"error": str(e)}
+        
+        return results
+    
+    def process_omr_array(self, image, debug=False, regions=None, ocr_cache=None):
+        """Process an already decoded OMR sheet image (BGR ndarray)."""
         if image is None:
             return {"error": "Could not load image"}
         
-        # Detect regions
-        regions = self.detect_regions(image)
+        # Detect regions (unless already detected by a batched call)
+        if regions is None:
+            regions = self.detect_regions(image)
         
         if debug:
             print(f"\nDetected regions: {list(regions.keys())}")
         
+        # Convert to grayscale once; all OCR and bubble crops are taken from it
+        gray = to_gray(image)
+        
         result = {
             "name": "",
             "roll_number": "",
@@ -263,23 +381,22 @@ class OMRProcessor:
             "answer_string": ""
         }
         
-        # Extract name
-        if "name" in regions:
-            result["name"] = self.extract_text(image, regions["name"]["box"])
-        
-        # Extract version
-        if "v_number" in regions:
-            result["version"] = self.extract_text(image, regions["v_number"]["box"])
+        # Start OCR on the text regions; the bubble work below overlaps with it
+        ocr_futures = {}
+        for key in ("name", "v_number"):
+            if key in regions:
+                ocr_futures[key] = self._io_pool.submit(self.extract_text, gray, regions[key]["box"], ocr_cache)
         
         # Extract roll number
         if "r_number" in regions:
             # Try bubble detection first
-            roll_from_bubbles = self.extract_roll_number_bubbles(image, regions["r_number"]["box"])
+            roll_from_bubbles = self.extract_roll_number_bubbles(gray, regions["r_number"]["box"])
             if roll_from_bubbles:
                 result["roll_number"] = roll_from_bubbles
             else:
                 # Fallback to OCR
-                result["roll_number"] = self.extract_text(image, regions["r_number"]["box"])
+                ocr_futures["r_number"] = self._io_pool.submit(self.extract_text, gray,
+                                                               regions["r_number"]["box"], ocr_cache)
         
         # Extract MCQ answers - prefer m_area over mcqs as it's usually larger
         mcq_region_to_use = None
@@ -292,13 +409,20 @@ class OMRProcessor:
             if debug:
                 print("Using mcqs for bubble detection")
         
+        bubbles = []
         if mcq_region_to_use:
-            result["answers"] = self.extract_mcq_answers(image, mcq_region_to_use)
+            bubbles = self.detect_bubbles_in_region(gray, mcq_region_to_use)
+            answers_arr = self.extract_mcq_answers(gray, mcq_region_to_use, bubbles=bubbles)
             
+            # Answers are already in question order, so no sorting is needed
+            result["answers"] = {f"Q{i}": ans for i, ans in enumerate(answers_arr, start=1)}
             # Create answer string (e.g., "ABCDABCD...")
-            sorted_questions = sorted(result["answers"].items(), 
-                                    key=lambda x: int(x[0].replace('Q', '')))
-            result["answer_string"] = "".join([ans if ans else "-" for _, ans in sorted_questions])
+            result["answer_string"] = "".join(ans or "-" for ans in answers_arr)
+        
+        # Collect OCR results (name, version, roll number fallback)
+        for key, field in (("name", "name"), ("v_number", "version"), ("r_number", "roll_number")):
+            if key in ocr_futures:
+                result[field] = ocr_futures[key].result()
         
         if debug:
             print(f"Name: {result['name']}")
@@ -306,6 +430,66 @@ class OMRProcessor:
             print(f"Version: {result['version']}")
             print(f"Total Questions: {len(result['answers'])}")
             print(f"Answer String: {result['answer_string']}")
+            
+            # Expose intermediate detections so debug tooling doesn't have to rerun them
+            result["_regions"] = regions
+            result["_bubbles"] = bubbles
         
         return result
 
+
+@lru_cache(maxsize=4)
+def get_processor(model_path):
+    """Return a shared OMRProcessor for model_path, loading the model only on first use."""
+    return OMRProcessor(model_path)
+
+
+class MicroBatcher:
+    """Collect region detection calls from concurrent threads into batched YOLO passes."""
+    
+    def __init__(self, processor, max_batch=8, max_wait=0.02, conf=0.25):
+        self.processor = processor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.conf = conf
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def detect_regions(self, image):
+        """Queue one image and block until its batch has been run."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((image, future))
+        return future.result()
+    
+    def _ensure_started(self):
+        # Started lazily so the dispatcher lives in the worker process after a fork
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            # Wait for the first request, then gather more until full or timed out
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                batch_regions = self.processor.detect_regions_batch([image for image, _ in batch], conf=self.conf)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), regions in zip(batch, batch_regions):
+                future.set_result(regions)
@@ -3,91 +3,138 @@ Setup verification script
 Run this to check if everything is properly configured
 """
 
+import hashlib
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
 
-def check_dependencies():
+def _safe_stat(path):
+    """Return os.stat(path), or None if it doesn't exist or can't be read"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+# Written after a fully passing run; holds setup_key() so unchanged setups skip the checks
+MARKER_PATH = ".setup_check.ok"
+
+def setup_key():
+    """Hash of the Python version and the mtimes of requirements, model and config"""
+    from config import MODEL_PATH
+    
+    mtimes = tuple(getattr(_safe_stat(path), "st_mtime", None)
+                   for path in ("requirements.txt", MODEL_PATH, "config.py"))
+    return hashlib.blake2b(repr((tuple(sys.version_info),) + mtimes).encode()).hexdigest()
+
+def check_dependencies(report):
     """Check if all required packages are installed"""
-    print("Checking dependencies...")
+    report.append("Checking dependencies...")
     required = ['cv2', 'numpy', 'ultralytics', 'easyocr', 'flask']
     missing = []
     
+    # Resolve each package without importing it (torch etc. take seconds to load)
     for package in required:
-        try:
-            __import__(package)
-            print(f"  ✓ {package}")
-        except ImportError:
-            print(f"  ✗ {package} - MISSING")
+        if find_spec(package) is not None:
+            report.append(f"  ✓ {package}")
+        else:
+            report.append(f"  ✗ {package} - MISSING")
             missing.append(package)
     
     return len(missing) == 0
 
-def check_model():
+def check_model(report):
     """Check if model file exists"""
-    print("\nChecking model file...")
+    report.append("\nChecking model file...")
     from config import MODEL_PATH
     
-    if os.path.exists(MODEL_PATH):
-        size_mb = os.path.getsize(MODEL_PATH) / (1024 * 1024)
-        print(f"  ✓ Model found: {MODEL_PATH}")
-        print(f"  ✓ Size: {size_mb:.2f} MB")
+    st = _safe_stat(MODEL_PATH)
+    if st is not None:
+        size_mb = st.st_size / (1024 * 1024)
+        report.append(f"  ✓ Model found: {MODEL_PATH}")
+        report.append(f"  ✓ Size: {size_mb:.2f} MB")
         return True
     else:
-        print(f"  ✗ Model NOT found at: {MODEL_PATH}")
-        print("  → Place your trained YOLOv8 model at the specified path")
+        report.append(f"  ✗ Model NOT found at: {MODEL_PATH}")
+        report.append("  → Place your trained YOLOv8 model at the specified path")
         return False
 
-def check_directories():
+def check_directories(report):
     """Check if required directories exist"""
-    print("\nChecking directories...")
+    report.append("\nChecking directories...")
     from config import TEST_IMAGES_DIR, OUTPUT_DIR, UPLOAD_FOLDER
     
     dirs_ok = True
     
     # Check test images
-    if os.path.exists(TEST_IMAGES_DIR):
-        num_images = len([f for f in os.listdir(TEST_IMAGES_DIR) 
-                         if f.endswith(('.jpg', '.png', '.jpeg'))])
-        print(f"  ✓ Test images directory: {num_images} images found")
-    else:
-        print(f"  ⚠ Test images directory not found (optional)")
+    try:
+        # One directory read; suffixes matched case-insensitively (.JPG, .Png, ...)
+        with os.scandir(TEST_IMAGES_DIR) as entries:
+            num_images = sum(1 for entry in entries
+                             if entry.is_file(follow_symlinks=False) and
+                             entry.name.lower().endswith(('.jpg', '.png', '.jpeg')))
+        report.append(f"  ✓ Test images directory: {num_images} images found")
+    except OSError:
+        report.append(f"  ⚠ Test images directory not found (optional)")
     
     # Create output directories if they don't exist
     for dir_name, dir_path in [("Output", OUTPUT_DIR), ("Upload", UPLOAD_FOLDER)]:
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
-            print(f"  ✓ Created {dir_name} directory: {dir_path}")
+        if _safe_stat(dir_path) is None:
+            os.makedirs(dir_path, exist_ok=True)
+            report.append(f"  ✓ Created {dir_name} directory: {dir_path}")
         else:
-            print(f"  ✓ {dir_name} directory exists")
+            report.append(f"  ✓ {dir_name} directory exists")
     
     return True
 
-def check_config():
+def check_config(report):
     """Check if config file is accessible"""
-    print("\nChecking configuration...")
+    report.append("\nChecking configuration...")
     try:
         import config
-        print(f"  ✓ config.py loaded")
-        print(f"  ✓ Model path: {config.MODEL_PATH}")
-        print(f"  ✓ Detection confidence: {config.DETECTION_CONFIDENCE}")
-        print(f"  ✓ Fill threshold: {config.FILL_THRESHOLD}")
+        report.append(f"  ✓ config.py loaded")
+        report.append(f"  ✓ Model path: {config.MODEL_PATH}")
+        report.append(f"  ✓ Detection confidence: {config.DETECTION_CONFIDENCE}")
+        report.append(f"  ✓ Fill threshold: {config.FILL_THRESHOLD}")
         return True
     except Exception as e:
-        print(f"  ✗ Error loading config: {e}")
+        report.append(f"  ✗ Error loading config: {e}")
         return False
 
+def run_checks(checks):
+    """Run check(report) functions concurrently, then print each report in order"""
+    reports = {name: [] for name in checks}
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = {name: executor.submit(check, reports[name]) for name, check in checks.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    
+    for report in reports.values():
+        for line in report:
+            print(line)
+    return results
+
 def main():
     print("="*60)
     print("OMR SHEET PROCESSOR - SETUP VERIFICATION")
     print("="*60)
     print()
     
-    checks = {
-        "Dependencies": check_dependencies(),
-        "Configuration": check_config(),
-        "Model File": check_model(),
-        "Directories": check_directories()
-    }
+    # Nothing changed since the last passing run
+    key = setup_key()
+    try:
+        with open(MARKER_PATH) as f:
+            if f.read().strip() == key:
+                print(f"✓ Setup unchanged since last successful check (cached OK; delete {MARKER_PATH} to re-run)")
+                return 0
+    except OSError:
+        pass
+    
+    checks = run_checks({
+        "Dependencies": check_dependencies,
+        "Configuration": check_config,
+        "Model File": check_model,
+        "Directories": check_directories
+    })
     
     print("\n" + "="*60)
     print("VERIFICATION SUMMARY")
@@ -103,6 +150,8 @@ def main():
     print("="*60)
     
     if all_passed:
+        with open(MARKER_PATH, "w") as f:
+            f.write(key)
         print("\n🎉 All checks passed! You're ready to process OMR sheets.")
         print("\nQuick start:")
         print("  python test.py          - Process single image")
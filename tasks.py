@@ -0,0 +1,29 @@
+"""
+Celery tasks for asynchronous OMR batch processing
+Start a worker with: celery -A tasks worker --concurrency=1
+(use one worker process per GPU so each owns its device)
+"""
+
+import os
+from celery import Celery
+from omr_processor import get_processor, decode_base64_image
+
+# Configuration
+MODEL_PATH = os.environ.get('MODEL_PATH', 'best.pt')
+BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', BROKER_URL)
+
+celery_app = Celery('omr_tasks', broker=BROKER_URL, backend=RESULT_BACKEND)
+
+@celery_app.task(name='omr.process_image')
+def process_omr_task(base64_image):
+    """Process one base64 encoded OMR sheet and return the full result dict"""
+    try:
+        image = decode_base64_image(base64_image)
+    except Exception:
+        image = None
+
+    # Loaded on first use in each worker process (any pool). Not done in
+    # worker_process_init: a cold model load exceeds the 4 s the prefork
+    # pool waits for a child to come up, so the child would be killed
+    return get_processor(MODEL_PATH).process_omr_array(image, debug=False)
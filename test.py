@@ -1,6 +1,9 @@
-import json
+import sys
+import threading
 import cv2
-from omr_processor import OMRProcessor
+import numpy as np
+import orjson
+from omr_processor import get_processor
 
 # -------------------------------------------------------
 # --- CONFIGURATION ---
@@ -18,7 +21,7 @@ print("OMR SHEET PROCESSOR")
 print("=" * 60)
 
 # Initialize processor
-processor = OMRProcessor(MODEL_PATH)
+processor = get_processor(MODEL_PATH)  # Cached per model path for this process
 
 # Process OMR
 print(f"\nProcessing: {IMAGE_PATH}")
@@ -29,6 +32,11 @@ if "error" in result:
     print(f"\n❌ ERROR: {result['error']}")
     exit(1)
 
+# Detections from process_omr (debug=True), reused for the debug image below
+image = result.pop("_image")
+regions = result.pop("_regions")
+bubbles = result.pop("_bubbles")
+
 # -------------------------------------------------------
 # --- DISPLAY RESULTS ---
 # -------------------------------------------------------
@@ -45,21 +53,22 @@ print(f"\n📊 Answer String:")
 print(f"   {result['answer_string']}")
 
 if len(result['answers']) > 0:
-    print(f"\n📋 Detailed Answers:")
-    for i in range(0, len(result['answers']), 10):
-        questions = list(result['answers'].items())[i:i+10]
-        q_nums = " ".join([f"{q:3s}" for q, _ in questions])
-        answers = " ".join([f"{a if a else '-':3s}" for _, a in questions])
-        print(f"   {q_nums}")
-        print(f"   {answers}")
-        print()
+    # Build the whole block (rows of 10 questions) and write it once
+    items = list(result['answers'].items())
+    lines = ["\n📋 Detailed Answers:"]
+    for i in range(0, len(items), 10):
+        questions = items[i:i+10]
+        lines.append("   " + " ".join([f"{q:3s}" for q, _ in questions]))
+        lines.append("   " + " ".join([f"{a if a else '-':3s}" for _, a in questions]))
+        lines.append("")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 # -------------------------------------------------------
 # --- SAVE RESULTS ---
 # -------------------------------------------------------
 # Save to JSON
-with open(OUTPUT_JSON, "w") as f:
-    json.dump(result, f, indent=4)
+with open(OUTPUT_JSON, "wb") as f:
+    f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
 
 print(f"💾 Results saved to: {OUTPUT_JSON}")
 
@@ -67,9 +76,6 @@ print(f"💾 Results saved to: {OUTPUT_JSON}")
 # --- SAVE DEBUG IMAGE (OPTIONAL) ---
 # -------------------------------------------------------
 if SAVE_DEBUG_IMAGE:
-    image = cv2.imread(IMAGE_PATH)
-    regions = processor.detect_regions(image)
-    
     # Draw regions
     colors = {
         "name": (0, 255, 0),      # Green
@@ -86,19 +92,24 @@ if SAVE_DEBUG_IMAGE:
         cv2.putText(image, region_name, (x1, y1-10), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
     
-    # Detect and draw bubbles in MCQ region
-    if "mcqs" in regions:
-        bubbles = processor.detect_bubbles_in_region(image, regions["mcqs"]["box"])
-        for bubble in bubbles:
-            cx, cy = bubble["center"]
-            is_filled = bubble["fill_ratio"] > 0.3
-            color = (0, 0, 255) if is_filled else (0, 255, 0)  # Red if filled, green if empty
+    # Draw the bubbles detected in the MCQ region, classified in one comparison
+    centers = np.array([b["center"] for b in bubbles], dtype=np.int32).reshape(-1, 2)
+    ratios = np.fromiter((b["fill_ratio"] for b in bubbles), dtype=np.float32, count=len(bubbles))
+    filled = ratios > 0.3
+    for mask, color in ((filled, (0, 0, 255)), (~filled, (0, 255, 0))):  # Red if filled, green if empty
+        for cx, cy in centers[mask].tolist():
             cv2.circle(image, (cx, cy), 5, color, -1)
     
+    # Encode and write in the background; joined before the script exits
     output_debug = "omr_debug_annotated.jpg"
-    cv2.imwrite(output_debug, image)
-    print(f"🖼️  Debug image saved to: {output_debug}")
+    debug_writer = threading.Thread(target=cv2.imwrite, args=(output_debug, image,
+                                    [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 0]))
+    debug_writer.start()
 
 print("\n" + "=" * 60)
 print("✅ PROCESSING COMPLETE!")
 print("=" * 60)
+
+if SAVE_DEBUG_IMAGE:
+    debug_writer.join()
+    print(f"🖼️  Debug image saved to: {output_debug}")